@@ -1,19 +1,22 @@
 #!/usr/bin/env python3
 
 import argparse
-import glob
-import io
+import http.client
 import json
 import os
 import re
 import subprocess
 import sys
-import urllib.error
 import urllib.request
 
 
 OUTPUT_MODE = "github"
 
+GITHUB_API_HOST = "api.github.com"
+
+# Persistent connection to the GitHub API, see _github_api_get()
+_github_api_connection: http.client.HTTPSConnection | None = None
+
 
 def configure_output_mode(mode: str) -> None:
     global OUTPUT_MODE
@@ -57,26 +60,27 @@ def _github_headers() -> dict[str, str]:
         "X-GitHub-Api-Version": "2026-03-10",
     }
 
-# Used to stop following 302 redirects
-class _NoRedirect302(urllib.request.HTTPRedirectHandler):
-    def http_error_302(self, req, fp, code, msg, headers):
-        return None
 
+def _github_api_get(path: str) -> tuple[int, http.client.HTTPMessage, bytes]:
+    """
+    Send a GET request to the GitHub API. Returns the status, headers and body of the response.
+    The connection is kept open so consecutive API calls share one TCP and TLS handshake.
+    Redirects are not followed.
+    """
+    global _github_api_connection
 
-def _download_url_handling_github_redirects(api_url: str) -> bytes:
-    request = urllib.request.Request(api_url, headers=_github_headers())
-    no_redirect_opener = urllib.request.build_opener(_NoRedirect302)
+    if _github_api_connection is None:
+        _github_api_connection = http.client.HTTPSConnection(GITHUB_API_HOST, timeout=30)
 
-    try:
-        with no_redirect_opener.open(request) as response:
-            return response.read()
-    # 302 redirects are caught and we expect an HTTPError
-    except urllib.error.HTTPError as err:
-        redirect_url = err.headers.get("Location")
-        redirect_request = urllib.request.Request(redirect_url)
+    # http.client does not add a User-Agent, which the GitHub API requires
+    headers = {**_github_headers(), "User-Agent": "snow-change-helper"}
+    _github_api_connection.request("GET", path, headers=headers)
+    response = _github_api_connection.getresponse()
+    body = response.read()
+    if response.status >= 400:
+        raise RuntimeError(f"GitHub API request {path} failed with status {response.status}")
 
-        with urllib.request.urlopen(redirect_request) as response:
-            return response.read()
+    return response.status, response.headers, body
 
 
 def build_snow_args() -> list[str]:
@@ -192,13 +196,11 @@ def extract_pr_jira() -> None:
     write_output("jira_link", jira_link)
 
 def _get_job_id(run_id, job):
-    api_url = (
-        f"https://api.github.com/repos/{os.environ['REPO_OWNER']}/"
+    api_path = (
+        f"/repos/{os.environ['REPO_OWNER']}/"
         f"{os.environ['REPO_NAME']}/actions/runs/{run_id}/jobs"
     )
-    request = urllib.request.Request(api_url, headers=_github_headers())
-    with urllib.request.urlopen(request) as response:
-        jobs_string = response.read()
+    _, _, jobs_string = _github_api_get(api_path)
 
     jobs = json.loads(jobs_string)["jobs"]
     matching_job_ids = [j["id"] for j in jobs if j["name"] == job]
@@ -211,15 +213,19 @@ def _get_job_id(run_id, job):
 def github_actions_logs(run_id: str, job) -> None:
     job_id = _get_job_id(run_id, job)
 
-    api_url = (
-        f"https://api.github.com/repos/{os.environ['REPO_OWNER']}/"
+    api_path = (
+        f"/repos/{os.environ['REPO_OWNER']}/"
         f"{os.environ['REPO_NAME']}/actions/jobs/{job_id}/logs"
     )
 
     # The request to Github API is a redirect 302
-    # If urllib follows the redirect, the second request returns 401
-    # We must handle the redirect explicitly
-    job_log = _download_url_handling_github_redirects(api_url).decode("utf-8")
+    # The redirect URL must be requested without the GitHub Authorization header, otherwise it returns 401
+    status, headers, body = _github_api_get(api_path)
+    if status == 302:
+        redirect_request = urllib.request.Request(headers["Location"])
+        with urllib.request.urlopen(redirect_request) as response:
+            body = response.read()
+    job_log = body.decode("utf-8")
 
     # We don't write to github output as it is printed when it is referenced then the workflow breaks
     # Write to standard out and the script must redirect to file
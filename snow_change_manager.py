@@ -1,14 +1,19 @@
 #!/usr/bin/env python
 
-import base64
+import binascii
+import functools
+import http.client
+import io
 import json
+import select
+import ssl
 import urllib.parse
-import urllib.request
 import urllib.error
 import sys
-import argparse
+import zlib
+import threading
+import time
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 
 ARGS_DESCRIPTION = """
 Create or update ServiceNow standard changes
@@ -70,10 +75,80 @@ SNOW_STATES = {
     "Closed": 3
 }
 
-LOCAL_TIMEZONE = ZoneInfo("Europe/London")
+REVIEW_RESULTS = frozenset({"successful", "unsuccessful"})
+
+# Headers sent with every API request, Content-Type is only added when there is a request body
+_BASE_HEADERS = {"Accept": "application/json", "Accept-Encoding": "gzip", "User-Agent": "snow-change-manager"}
+_JSON_BODY_HEADERS = {**_BASE_HEADERS, "Content-Type": "application/json"}
+_GZIP_BODY_HEADERS = {**_JSON_BODY_HEADERS, "Content-Encoding": "gzip"}
+
+# Request bodies larger than this many bytes are sent gzip compressed, e.g. long work notes
+GZIP_BODY_SIZE = 1024
+
+# Compact JSON encoder for request bodies. Created once rather than on every request.
+JSON_ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+# Request bodies for review(). There is one per result so they are serialized once at import time.
+REVIEW_PAYLOADS = {
+    "successful": JSON_ENCODER.encode({
+        "state": SNOW_STATES["Review"],
+        "close_code": "successful",
+        "close_notes": "Change completed successfully"}).encode("utf-8"),
+    "unsuccessful": JSON_ENCODER.encode({
+        "state": SNOW_STATES["Review"],
+        "close_code": "unsuccessful",
+        "close_notes": "Change did not complete successfully"}).encode("utf-8"),
+}
+
+# Query string for create() with the standard API, encoded the same way as urllib.parse.urlencode()
+CREATE_QUERY_TEMPLATE = (
+    "short_description={short_description}"
+    f"&state={SNOW_STATES['Scheduled']}"
+    "&start_date={start_date}"
+    "&end_date={end_date}")
+
+LOCAL_TIMEZONE_NAME = "Europe/London"
 
 NHS_WORK_NOTE_SIZE = 4000
 
+# Seconds to wait for ServiceNow to accept a connection or send data before giving up
+REQUEST_TIMEOUT = 30
+
+# Methods sent again when a reused connection fails after the request was sent. PUT is left out because the
+# NHS API uses it to append work notes
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Attempts to open a connection again when the host refuses or drops it, with exponential backoff in seconds
+CONNECT_RETRIES = 3
+CONNECT_RETRY_BACKOFF = 0.1
+
+# Maximum number of bytes read from an error response body, enough for the ServiceNow JSON error details
+ERROR_BODY_SIZE = 4096
+
+# OAuth bearer tokens and their expiry time, see get_oauth_bearer_token()
+_OAUTH_TOKENS = {}
+OAUTH_TOKEN_LIFETIME = 1800
+# Seconds before the expiry when a cached token is no longer used
+OAUTH_TOKEN_EXPIRY_MARGIN = 60
+
+# Successful template lookups keyed by the get_template_id() arguments. Template ids do not change during a run
+_TEMPLATE_IDS = {}
+
+# Persistent HTTPS connections keyed by host, one set per thread. See get_connection()
+_CONNECTIONS = threading.local()
+
+# Latest TLS session negotiated with each host. See ResumableHTTPSConnection
+_TLS_SESSIONS = {}
+
+# Batch operations are retried when ServiceNow is rate limiting or temporarily unavailable
+BATCH_RETRY_STATUSES = frozenset({429, 503})
+# A gateway error may come after ServiceNow applied the request, so only commands safe to repeat are retried.
+# create would make a duplicate change and post-work-note would post earlier chunks again
+BATCH_GATEWAY_RETRY_STATUSES = frozenset({502, 504})
+BATCH_IDEMPOTENT_COMMANDS = frozenset({"get", "get-template-id", "implement", "review"})
+BATCH_RETRIES = 3
+BATCH_MAX_WORKERS = 8
+
 def resolve_endpoint(custom, function_name, **params):
     """
     Resolve API endpoint to accomodate the standard ServiceNow API and the NHS custom API endpoints.
@@ -85,14 +160,196 @@ def resolve_endpoint(custom, function_name, **params):
     return route["method"], route["path"].format(**params)
 
 
+def configure_request_timeout(timeout):
+    global REQUEST_TIMEOUT
+    REQUEST_TIMEOUT = timeout
+
+
+@functools.lru_cache(maxsize=1)
+def get_ssl_context():
+    """
+    Return the TLS context shared by all connections.
+    The CA certificates are loaded once, and a shared context is required to resume TLS sessions across connections.
+    """
+
+    return ssl.create_default_context()
+
+
+class ResumableHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPS connection resuming the last TLS session negotiated with the same host.
+    A new connection, e.g. after the server closed an idle keep-alive connection or in another batch worker thread,
+    then skips the full TLS handshake when the server supports session resumption.
+    """
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(
+            self.sock, server_hostname=server_hostname, session=_TLS_SESSIONS.get(server_hostname))
+
+    def getresponse(self):
+        # TLS 1.3 session tickets are only received after the handshake, so the session is saved once a response is read
+        response = super().getresponse()
+        self._save_tls_session()
+        return response
+
+    def close(self):
+        self._save_tls_session()
+        super().close()
+
+    def _save_tls_session(self):
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            _TLS_SESSIONS[self._tunnel_host or self.host] = session
+
+
+def new_connection(host):
+    """
+    Create an HTTPS connection to the host.
+    Honours HTTPS_PROXY and NO_PROXY like urllib.request.urlopen: the connection then goes to the proxy
+    and tunnels to the host with CONNECT.
+    """
+
+    # Only read when a connection is created, urllib.request is not otherwise needed
+    import urllib.request
+
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(host):
+        return ResumableHTTPSConnection(host, timeout=REQUEST_TIMEOUT, context=get_ssl_context())
+
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    proxy_parts = urllib.parse.urlsplit(proxy)
+    conn = ResumableHTTPSConnection(
+        proxy_parts.hostname, proxy_parts.port or 80, timeout=REQUEST_TIMEOUT, context=get_ssl_context())
+    tunnel_headers = {}
+    if proxy_parts.username:
+        credentials = f"{urllib.parse.unquote(proxy_parts.username)}:{urllib.parse.unquote(proxy_parts.password or '')}"
+        tunnel_headers["Proxy-Authorization"] = "Basic " + binascii.b2a_base64(
+            credentials.encode("utf-8"), newline=False).decode("ascii")
+    conn.set_tunnel(host, headers=tunnel_headers)
+    return conn
+
+
+def get_connection(host):
+    """
+    Return the persistent HTTPS connection to the host, creating it on first use.
+    Keeping the connection open lets a sequence of requests to the same ServiceNow instance
+    pay for the TCP and TLS handshakes only once.
+    A connection cannot be shared between threads, so each thread has its own.
+    """
+
+    connections = _CONNECTIONS.__dict__.setdefault("by_host", {})
+    conn = connections.get(host)
+    if conn is None:
+        conn = new_connection(host)
+        connections[host] = conn
+    return conn
+
+
+def close_connections():
+    """
+    Close the persistent connections opened by the current thread.
+    """
+
+    for conn in _CONNECTIONS.__dict__.pop("by_host", {}).values():
+        conn.close()
+
+
+def connect(conn):
+    """
+    Open the connection, retrying with exponential backoff when the host refuses or resets the attempt.
+    Nothing has been sent at this point, so retrying is safe for every method.
+    Timeouts are not retried, each attempt could already take REQUEST_TIMEOUT seconds.
+    """
+
+    for attempt in range(CONNECT_RETRIES + 1):
+        try:
+            conn.connect()
+            return
+        except ConnectionError:
+            conn.close()
+            if attempt == CONNECT_RETRIES:
+                raise
+            time.sleep(CONNECT_RETRY_BACKOFF * 2 ** attempt)
+
+
+def connection_dropped(conn):
+    """
+    Check whether the server closed an idle keep-alive connection.
+    Nothing is expected on an idle connection, so a readable socket means the server closed it.
+    """
+
+    readable, _, _ = select.select([conn.sock], [], [], 0)
+    return bool(readable)
+
+
+def open_url(url, method, headers, data=None):
+    """
+    Send a request over the persistent connection to the url host.
+    Behaves like urllib.request.urlopen for errors: raises urllib.error.HTTPError for a non 2xx status
+    and urllib.error.URLError when the host cannot be reached.
+    Gzip compressed responses are decompressed. Error responses are read up to ERROR_BODY_SIZE bytes.
+    Returns (status, body) where body is bytes.
+    """
+
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += "?" + parts.query
+
+    conn = get_connection(parts.netloc)
+    if conn.sock is not None and connection_dropped(conn):
+        conn.close()
+    while True:
+        reused = conn.sock is not None
+        sent = False
+        try:
+            if not reused:
+                connect(conn)
+            conn.request(method, target, body=data, headers=headers)
+            sent = True
+            resp = conn.getresponse()
+            if 200 <= resp.status < 300:
+                body = resp.read()
+            else:
+                body = resp.read(ERROR_BODY_SIZE)
+                if not resp.isclosed():
+                    # The rest of the error body is not wanted and the connection cannot be reused without reading it
+                    conn.close()
+            break
+        except (ConnectionResetError, BrokenPipeError) as exc:
+            conn.close()
+            # The server may have closed the reused connection just as the request was sent. The request is sent
+            # again on a new connection if it could not be written, or if the server may have processed it but
+            # the method is idempotent. http.client.RemoteDisconnected is a ConnectionResetError.
+            if not reused or (sent and method not in IDEMPOTENT_METHODS):
+                raise urllib.error.URLError(exc) from exc
+        except (OSError, http.client.HTTPException) as exc:
+            # A malformed response leaves the connection waiting for it, it must be closed to be usable again
+            conn.close()
+            raise urllib.error.URLError(exc) from exc
+
+    if resp.getheader("Content-Encoding") == "gzip":
+        # A decompressor object accepts the truncated error bodies, unlike gzip.decompress()
+        body = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16).decompress(body)
+
+    if not 200 <= resp.status < 300:
+        raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+    return resp.status, body
+
+
+@functools.lru_cache(maxsize=1)
 def get_basic_auth_header(user, password):
     """
     Create the Authentication header value for HTTP basic auth
     Requires ServiceNow username and password
+    The value is cached so callers running several commands in one process encode the credentials once.
     """
 
-    creds = f"{user}:{password}".encode("utf-8")
-    return "Basic " + base64.b64encode(creds).decode("ascii")
+    creds = user.encode("utf-8") + b":" + password.encode("utf-8")
+    return "Basic " + binascii.b2a_base64(creds, newline=False).decode("ascii")
 
 
 def validate_cli_arguments(parser, args):
@@ -131,13 +388,21 @@ def get_oauth_bearer_token(snow_url, snow_client_id, snow_client_secret):
     When using oauth authentication, request the bearer token. It is then used in any API request in the Authentication header.
     It is valid for 30 min.
     Requires API client id and secret.
+    The token is cached until shortly before it expires, so a long running process such as serve
+    requests a new one only when needed.
 
     See: https://nhsdigitallive.service-now.com/nhs_digital?id=kb_article_view&sys_kb_id=cbaafe453b7cfe1067201da985e45a75
     """
 
+    cache_key = (snow_url, snow_client_id, snow_client_secret)
+    cached = _OAUTH_TOKENS.get(cache_key)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+
     url = f"{snow_url}/oauth_token.do"
     headers = {
         "Accept": "application/json",
+        "Accept-Encoding": "gzip",
         "Content-Type": "application/x-www-form-urlencoded",
     }
     payload = urllib.parse.urlencode(
@@ -148,23 +413,21 @@ def get_oauth_bearer_token(snow_url, snow_client_id, snow_client_secret):
         }
     ).encode("utf-8")
 
-    req = urllib.request.Request(
-        url,
-        data=payload,
-        headers=headers,
-        method="POST")
-    with urllib.request.urlopen(req) as resp:
-        body = resp.read().decode("utf-8")
-        try:
-            data = json.loads(body) if body else {}
-        except json.JSONDecodeError as exc:
-            raise ValueError("OAuth token response is not valid JSON") from exc
+    # Sent over the same persistent connection as the API requests that use the token
+    _, body = open_url(url, "POST", headers, payload)
+    try:
+        data = json.loads(body) if body else {}
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise ValueError("OAuth token response is not valid JSON") from exc
 
     access_token = data.get("access_token") if isinstance(data, dict) else None
     if not access_token:
         raise ValueError("OAuth token response did not include access_token")
 
-    return f"Bearer {access_token}"
+    auth_header = f"Bearer {access_token}"
+    expires_in = int(data.get("expires_in", OAUTH_TOKEN_LIFETIME))
+    _OAUTH_TOKENS[cache_key] = (auth_header, time.monotonic() + expires_in - OAUTH_TOKEN_EXPIRY_MARGIN)
+    return auth_header
 
 
 def send_request(url, method, auth_header, payload=None, extra_headers=None):
@@ -173,40 +436,56 @@ def send_request(url, method, auth_header, payload=None, extra_headers=None):
     Returns (status, data) where data is parsed JSON when possible.
     """
 
-    headers = {"Accept": "application/json",
-               "Content-Type": "application/json"}
-    if extra_headers:
-        headers.update(extra_headers)
-    headers["Authorization"] = auth_header
-
+    # All JSON serialization goes through JSON_ENCODER here, callers pass dicts or pre-encoded bytes
     if isinstance(payload, dict):
-        data = json.dumps(payload).encode("utf-8")
+        data = JSON_ENCODER.encode(payload).encode("utf-8")
     else:
         data = payload  # bytes or None
 
-    req = urllib.request.Request(
-        url, data=data, headers=headers, method=method)
-    with urllib.request.urlopen(req) as resp:
-        status = resp.getcode()
-        body = resp.read().decode("utf-8")
-        try:
-            data = json.loads(body) if body else None
-        except json.JSONDecodeError:
-            print("Error decoding JSON response:" + body)
-            sys.exit(1)
-        return status, data
+    if data is None:
+        base_headers = _BASE_HEADERS
+    elif len(data) > GZIP_BODY_SIZE:
+        # Fastest compression level: JSON text compresses well and the CPU time matters more than the last bytes
+        compressor = zlib.compressobj(1, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        data = compressor.compress(data) + compressor.flush()
+        base_headers = _GZIP_BODY_HEADERS
+    else:
+        base_headers = _JSON_BODY_HEADERS
+    headers = {**base_headers, **(extra_headers or {}), "Authorization": auth_header}
+
+    status, body = open_url(url, method, headers, data)
+    # json.loads() decodes the UTF-8 bytes itself, the body is only converted to text to report an error
+    try:
+        data = json.loads(body) if body else None
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ValueError(
+            "Error decoding JSON response:" + body[:ERROR_BODY_SIZE].decode("utf-8", errors="replace")) from None
+    return status, data
+
+
+@functools.lru_cache(maxsize=1)
+def get_local_timezone():
+    """
+    Load the local time zone on first use.
+    Only create() needs it, so other commands skip importing zoneinfo and reading the time zone database.
+    """
+
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(LOCAL_TIMEZONE_NAME)
 
 
-def get_datetime(minutes=0):
+def get_datetime(minutes=0, now=None):
     """
     Generates the date/time string minutes into the future.
     The time zone must be specified because of variations of regions and DST.
+    now is the base time, the current time by default. Passing it lets several date/time strings share one clock reading.
     """
 
     delta = timedelta(minutes=minutes)
-    datetime_now = datetime.now(tz=LOCAL_TIMEZONE)
+    datetime_now = now or datetime.now(tz=get_local_timezone())
     datetime_plus_delta = datetime_now + delta
-    return datetime_plus_delta.strftime("%Y-%m-%d %H:%M:%S")
+    # Same output as strftime("%Y-%m-%d %H:%M:%S"). The time zone is dropped so isoformat() does not add the offset
+    return datetime_plus_delta.replace(tzinfo=None).isoformat(sep=" ", timespec="seconds")
 
 
 def get_sys_id_if_required(snow_url, number, auth_header, custom, snow_profile):
@@ -221,12 +500,27 @@ def get_sys_id_if_required(snow_url, number, auth_header, custom, snow_profile):
         status, data = get_by_number(
             snow_url=snow_url, number=number, auth_header=auth_header, custom=custom, snow_profile=snow_profile)
         if status != 200:
-            print(f"Error: Unexpected status code - {status}")
-            sys.exit(1)
+            raise ValueError(f"Error: Unexpected status code - {status}")
+        if not data or not data.get("result"):
+            raise ValueError(f"Change {number} not found")
         sys_id = data["result"][0]["sys_id"]["value"]
     return sys_id
 
 
+def resolve_change_url(snow_url, function_name, number, auth_header, custom, snow_profile):
+    """
+    Resolve the endpoint of a function operating on an existing change identified by number.
+    Uses get_sys_id_if_required() to get the sys_id for the standard API.
+    Returns HTTP verb and full URL.
+    """
+
+    sys_id = get_sys_id_if_required(
+        snow_url, number, auth_header, custom, snow_profile)
+    method, path = resolve_endpoint(
+        custom, function_name, number=number, sys_id=sys_id, snow_profile=snow_profile)
+    return method, f"{snow_url}{path}"
+
+
 def create(
         snow_url,
         snow_standard_change,
@@ -259,19 +553,26 @@ def create(
         snow_profile=snow_profile,
     )
     base_url = f"{snow_url}{path}"
-    params = {
-        "short_description": short_description,
-        "state": SNOW_STATES["Scheduled"],
-        "start_date": get_datetime(),
-        "end_date": get_datetime(60)
-    }
+    now = datetime.now(tz=get_local_timezone())
+    start_date = get_datetime(now=now)
+    end_date = get_datetime(60, now=now)
 
     if custom:
         # Send data in the request body
+        params = {
+            "short_description": short_description,
+            "state": SNOW_STATES["Scheduled"],
+            "start_date": start_date,
+            "end_date": end_date
+        }
         return send_request(base_url, method, auth_header, payload=params)
     else:
-        url = base_url + "?" + urllib.parse.urlencode(params)
-        # Send data in the request query string
+        # Send data in the request query string. The parameters are fixed so only the values are escaped.
+        # The dates only contain digits, "-", " " and ":", so they are escaped as quote_plus() would without calling it.
+        url = base_url + "?" + CREATE_QUERY_TEMPLATE.format(
+            short_description=urllib.parse.quote_plus(short_description),
+            start_date=start_date.replace(" ", "+").replace(":", "%3A"),
+            end_date=end_date.replace(" ", "+").replace(":", "%3A"))
         return send_request(url, method, auth_header)
 
 
@@ -283,7 +584,7 @@ def implement(snow_url, number, auth_header, custom, snow_profile):
         https://www.servicenow.com/docs/r/api-reference/rest-apis/change-management-api.html
     Endpoint:
         PATCH /api/sn_chg_rest/change/{sys_id}
-    Uses get_sys_id_if_required() and the change number to get sys_id.
+    Uses resolve_change_url() and the change number to get sys_id.
 
     NHS custom API:
         https://nhsdigitallive.service-now.com/nhs_digital?id=kb_article_view&sys_kb_id=f3783a8d3b3cfe1067201da985e45ab3
@@ -293,11 +594,8 @@ def implement(snow_url, number, auth_header, custom, snow_profile):
     Returns (status, data) where data is parsed JSON (or raw body on parse error).
     """
 
-    sys_id = get_sys_id_if_required(
-        snow_url, number, auth_header, custom, snow_profile)
-    method, path = resolve_endpoint(
-        custom, "update", number=number, sys_id=sys_id, snow_profile=snow_profile)
-    url = f"{snow_url}{path}"
+    method, url = resolve_change_url(
+        snow_url, "update", number, auth_header, custom, snow_profile)
     fields = {"state": SNOW_STATES["Implement"]}
     return send_request(url, method, auth_header, payload=fields)
 
@@ -310,7 +608,7 @@ def review(snow_url, number, auth_header, result, custom, snow_profile):
         https://www.servicenow.com/docs/r/api-reference/rest-apis/change-management-api.html
     Endpoint:
       PATCH /api/sn_chg_rest/change/{sys_id}
-    Uses get_sys_id_if_required() and the change number to get sys_id.
+    Uses resolve_change_url() and the change number to get sys_id.
 
     NHS custom API:
         https://nhsdigitallive.service-now.com/nhs_digital?id=kb_article_view&sys_kb_id=f3783a8d3b3cfe1067201da985e45ab3
@@ -320,27 +618,12 @@ def review(snow_url, number, auth_header, result, custom, snow_profile):
     Returns (status, data) where data is parsed JSON (or raw body on parse error).
     """
 
-    if result not in ("successful", "unsuccessful"):
-        raise ValueError("result must be one of: successful, unsuccessful")
-
-    if result == "successful":
-        close_code = "successful"
-        close_notes = "Change completed successfully"
-    else:
-        close_code = "unsuccessful"
-        close_notes = "Change did not complete successfully"
-
-    sys_id = get_sys_id_if_required(
-        snow_url, number, auth_header, custom, snow_profile)
-    method, path = resolve_endpoint(
-        custom, "update", number=number, sys_id=sys_id, snow_profile=snow_profile)
-    url = f"{snow_url}{path}"
-    fields = {
-        "state": SNOW_STATES["Review"],
-        "close_code": close_code,
-        "close_notes": close_notes}
+    if result not in REVIEW_RESULTS:
+        raise ValueError(f"result must be one of: {', '.join(sorted(REVIEW_RESULTS))}")
 
-    return send_request(url, method, auth_header, payload=fields)
+    method, url = resolve_change_url(
+        snow_url, "update", number, auth_header, custom, snow_profile)
+    return send_request(url, method, auth_header, payload=REVIEW_PAYLOADS[result])
 
 
 def get_by_number(snow_url, number, auth_header, custom, snow_profile):
@@ -363,11 +646,11 @@ def get_by_number(snow_url, number, auth_header, custom, snow_profile):
     method, path = resolve_endpoint(
         custom, "get_by_number", snow_profile=snow_profile, number=number)
     base_url = f"{snow_url}{path}"
-    query = f"number={urllib.parse.quote(number)}"
-    url = base_url + "?" + urllib.parse.urlencode({"sysparm_query": query})
     if custom:
         return send_request(base_url, method, auth_header)
     else:
+        # sysparm_query=number={number} with only the number left to escape
+        url = f"{base_url}?sysparm_query=number%3D{urllib.parse.quote_plus(number)}"
         return send_request(url, method, auth_header)
 
 
@@ -386,13 +669,21 @@ def get_template_id(snow_url, auth_header, name, custom, snow_profile):
         GET /api/x_nhsd_intstation/nhs_integration/record/{profile}/getStandardChgTemplateID
 
     Returns (status, data) where data is parsed JSON (or raw body on parse error).
+    Successful responses are cached for the rest of the process.
     """
 
+    cache_key = (snow_url, auth_header, name, custom, snow_profile)
+    cached = _TEMPLATE_IDS.get(cache_key)
+    if cached:
+        return cached
+
     method, path = resolve_endpoint(custom, "get_template_id", snow_profile=snow_profile)
-    base_url = f"{snow_url}{path}"
-    query = f"active=true^name={name}"
-    url = base_url + "?" + urllib.parse.urlencode({"sysparm_query": query})
-    return send_request(url, method, auth_header)
+    # sysparm_query=active=true^name={name} with only the name left to escape
+    url = f"{snow_url}{path}?sysparm_query=active%3Dtrue%5Ename%3D{urllib.parse.quote_plus(name)}"
+    status, data = send_request(url, method, auth_header)
+    if status == 200:
+        _TEMPLATE_IDS[cache_key] = (status, data)
+    return status, data
 
 
 def post_work_note(snow_url, number, auth_header, work_note, custom, snow_profile):
@@ -404,7 +695,7 @@ def post_work_note(snow_url, number, auth_header, work_note, custom, snow_profil
         https://www.servicenow.com/docs/r/api-reference/rest-apis/c_TableAPI.html
     Endpoint:
       PATCH /api/now/table/change_request/{sys_id}
-    Uses get_sys_id_if_required() and the change number to get sys_id.
+    Uses resolve_change_url() and the change number to get sys_id.
 
     NHS custom API:
         https://nhsdigitallive.service-now.com/nhs_digital?id=kb_article_view&sys_kb_id=f3783a8d3b3cfe1067201da985e45ab3
@@ -414,11 +705,8 @@ def post_work_note(snow_url, number, auth_header, work_note, custom, snow_profil
     Returns (status, data) where data is parsed JSON (or raw body on parse error).
     """
 
-    sys_id = get_sys_id_if_required(
-        snow_url, number, auth_header, custom, snow_profile)
-    method, path = resolve_endpoint(
-        custom, "post_work_note", snow_profile=snow_profile, number=number, sys_id=sys_id)
-    url = f"{snow_url}{path}"
+    method, url = resolve_change_url(
+        snow_url, "post_work_note", number, auth_header, custom, snow_profile)
 
     # The NHS API is limited to 4000 characters per work note
     # Keep 100 characters for additional text in each section
@@ -443,7 +731,241 @@ def post_work_note(snow_url, number, auth_header, work_note, custom, snow_profil
     return last_status, last_data
 
 
-def main():
+# Commands keyed by name: the API call taking the run_command() arguments, the result type selecting how the result
+# is printed for the standard and the custom API, and the progress message.
+COMMANDS = {
+    "create": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: create(
+            snow_url, params["standard_change"], auth_header,
+            short_description=params["short_description"], custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "single_change", "custom": "single_change"},
+        "message": "Creating change from template {standard_change}..."},
+    "implement": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: implement(
+            snow_url, params["number"], auth_header, custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "single_change", "custom": "single_change"},
+        "message": "Updating change {number} state to Implement..."},
+    "review": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: review(
+            snow_url, params["number"], auth_header,
+            result=params["result"], custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "single_change", "custom": "single_change"},
+        "message": "Updating change {number} state to Review with result {result}..."},
+    "get": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: get_by_number(
+            snow_url, params["number"], auth_header, custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "change_list", "custom": "single_change"},
+        "message": "Retrieving change with number {number}..."},
+    "get-template-id": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: get_template_id(
+            snow_url, auth_header, name=params["name"], custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "template_list", "custom": "template_list"},
+        "message": "Retrieving template \"{name}\"..."},
+    "post-work-note": {
+        "call": lambda snow_url, auth_header, custom, snow_profile, params: post_work_note(
+            snow_url, params["number"], auth_header,
+            work_note=params["text"], custom=custom, snow_profile=snow_profile),
+        "result_type": {"standard": "table_item", "custom": "table_item"},
+        "message": "Posting work note..."},
+}
+
+
+# Operation fields required by each command in batch and serve mode, all of them strings
+OPERATION_FIELDS = {
+    "create": ("standard_change", "short_description"),
+    "implement": ("number",),
+    "review": ("number", "result"),
+    "get": ("number",),
+    "get-template-id": ("name",),
+    "post-work-note": ("number", "text"),
+}
+
+
+def check_operation(operation):
+    """
+    Check a batch operation names a known command and has the fields of the command as strings.
+    Returns the error message, or None when the operation is valid.
+    """
+
+    command = operation.get("command")
+    if not isinstance(command, str) or command not in OPERATION_FIELDS:
+        return f"Unknown command: {command}"
+    for field in OPERATION_FIELDS[command]:
+        if field not in operation:
+            return f"Missing operation field: {field}"
+        if not isinstance(operation[field], str):
+            return f"Operation field {field} must be a string"
+    return None
+
+
+def run_command(snow_url, auth_header, custom, snow_profile, command, params, verbose=False):
+    """
+    Run a single command against the ServiceNow API.
+    params holds the command arguments keyed by their command line argument names, e.g. "number" for --number.
+    Returns (status, data, result_type) where result_type selects how the result is printed.
+    """
+
+    try:
+        spec = COMMANDS[command]
+    except KeyError:
+        raise ValueError(f"Unknown command: {command}") from None
+
+    if verbose: print(spec["message"].format_map(params))
+    status, data = spec["call"](snow_url, auth_header, custom, snow_profile, params)
+    return status, data, spec["result_type"]["custom" if custom else "standard"]
+
+
+def run_batch_operation(snow_url, auth_header, custom, snow_profile, operation, deadline=None):
+    """
+    Run one batch operation. The operation is a dict with the command name in "command"
+    and the command arguments, e.g. {"command": "implement", "number": "CHG0030052"}.
+    Retries with exponential backoff while ServiceNow is rate limiting or unavailable,
+    and after gateway errors for the commands safe to repeat.
+    No new attempt is started after the deadline, a time.monotonic() value, and the backoff does not wait past it.
+    Returns the operation result as a dict with either "data" or "error".
+    """
+
+    params = dict(operation)
+    command = params.pop("command", None)
+    error = check_operation(operation)
+    if error:
+        return {"command": command, "error": error}
+    retry_statuses = BATCH_RETRY_STATUSES
+    if command in BATCH_IDEMPOTENT_COMMANDS:
+        retry_statuses = BATCH_RETRY_STATUSES | BATCH_GATEWAY_RETRY_STATUSES
+
+    result = {"command": command, "error": "Batch total timeout reached"}
+    for attempt in range(BATCH_RETRIES + 1):
+        if deadline is not None and time.monotonic() >= deadline:
+            # The error of the last attempt if there was one
+            return result
+        try:
+            status, data, _ = run_command(snow_url, auth_header, custom, snow_profile, command, params)
+            return {"command": command, "status": status, "data": data}
+        except urllib.error.HTTPError as e:
+            result = {"command": command, "status": e.code, "error": e.read().decode("utf-8", errors="replace")}
+            if e.code not in retry_statuses or attempt == BATCH_RETRIES:
+                return result
+        except urllib.error.URLError as e:
+            return {"command": command, "error": f"Request failed: {e.reason}"}
+        except ValueError as e:
+            return {"command": command, "error": str(e)}
+        except Exception as e:
+            # One failed operation must not lose the results of the others, some already applied on ServiceNow
+            return {"command": command, "error": f"Operation failed: {type(e).__name__}: {e}"}
+        delay = 2 ** attempt
+        if deadline is not None:
+            delay = max(0, min(delay, deadline - time.monotonic()))
+        time.sleep(delay)
+
+
+def run_batch(snow_url, auth_header, custom, snow_profile, operations, max_workers=BATCH_MAX_WORKERS,
+              total_timeout=None):
+    """
+    Run independent operations concurrently, so a batch of N changes costs roughly the time of
+    the slowest request instead of N sequential round trips.
+    Each worker thread keeps its own persistent connection for all the operations it runs.
+    Operations not started within total_timeout seconds are reported as errors.
+    Returns the operation results in the same order as the operations.
+    """
+
+    # Only needed by the batch command, imported here to keep the CLI start up fast
+    from concurrent.futures import ThreadPoolExecutor
+
+    deadline = None if total_timeout is None else time.monotonic() + total_timeout
+
+    # Persistent connections of each worker thread, closed once all the operations are done
+    worker_connections = {}
+
+    def run_operation(operation):
+        try:
+            return run_batch_operation(snow_url, auth_header, custom, snow_profile, operation, deadline)
+        finally:
+            worker_connections[threading.get_ident()] = _CONNECTIONS.__dict__.get("by_host", {})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_operation, operations))
+    for connections in worker_connections.values():
+        for conn in connections.values():
+            conn.close()
+    return results
+
+
+def serve(snow_url, get_auth_header, custom, snow_profile, input_stream=None, output_stream=None):
+    """
+    Run operations read one JSON line at a time, in the batch operation format, until the end of the input.
+    Writes one JSON result line per operation as soon as it completes.
+    A workflow can keep this process running and send it create, implement and review in turn,
+    so all of them share one process and one persistent connection.
+    get_auth_header is called for each operation, so an expired OAuth token is renewed.
+    Uses standard input and output by default.
+    """
+
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    for line in input_stream:
+        if not line.strip():
+            continue
+        try:
+            operation = json.loads(line)
+        except json.JSONDecodeError:
+            result = {"error": "Invalid JSON operation"}
+        else:
+            if isinstance(operation, dict):
+                try:
+                    auth_header = get_auth_header()
+                except Exception as e:
+                    result = {"error": f"Authentication failed: {e}"}
+                else:
+                    result = run_batch_operation(snow_url, auth_header, custom, snow_profile, operation)
+            else:
+                result = {"error": "Operation must be a JSON object"}
+        output_stream.write(json.dumps(result) + "\n")
+        output_stream.flush()
+
+
+def read_batch_operations(parser, path):
+    """
+    Read the batch operations from a file with one JSON object per line. Blank lines are ignored.
+    The path "-" reads from standard input.
+    """
+
+    if path == "-":
+        lines = sys.stdin.readlines()
+    else:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except OSError as e:
+            parser.error(f"Cannot read batch file {path}: {e.strerror}")
+
+    operations = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            operation = json.loads(line)
+        except json.JSONDecodeError:
+            parser.error(f"Invalid JSON in batch operation on line {line_number}")
+        if not isinstance(operation, dict):
+            parser.error(f"Batch operation on line {line_number} must be a JSON object")
+        error = check_operation(operation)
+        if error:
+            parser.error(f"Batch operation on line {line_number}: {error}")
+        operations.append(operation)
+    return operations
+
+
+@functools.lru_cache(maxsize=1)
+def build_parser():
+    """
+    Build the command line parser.
+    The parser is built once per process and reused by every main() call.
+    """
+
+    # argparse is only needed by the CLI, importing it here keeps the module quick to import as a library
+    import argparse
+
     parser = argparse.ArgumentParser(
         description=ARGS_DESCRIPTION,
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -479,7 +1001,12 @@ def main():
     parser.add_argument(
         "--verbose",
         action="store_true",
-        help="print progress messages")
+        help="print progress messages, ignored with --json")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=REQUEST_TIMEOUT,
+        help=f"seconds to wait for a ServiceNow response before failing (default: {REQUEST_TIMEOUT})")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # create subcommand
@@ -511,9 +1038,7 @@ def main():
         help="Change number e.g CHG0030052 (required)")
     sp_review.add_argument(
         "--result",
-        choices=[
-            "successful",
-            "unsuccessful"],
+        choices=sorted(REVIEW_RESULTS),
         required=True,
         help="result for close (required)")
 
@@ -551,125 +1076,154 @@ def main():
         action="store_true",
         help="read work note text from standard input")
 
-    args = parser.parse_args()
+    # batch subcommand: run many operations concurrently
+    sp_batch = subparsers.add_parser(
+        "batch",
+        help="Run operations read from a file of JSON lines concurrently")
+    sp_batch.add_argument(
+        "--file",
+        required=True,
+        help="file with one JSON operation per line, - for standard input (required). "
+        "Example line: {\"command\": \"implement\", \"number\": \"CHG0030052\"}")
+    sp_batch.add_argument(
+        "--max-workers",
+        type=int,
+        default=BATCH_MAX_WORKERS,
+        help=f"maximum number of concurrent requests (default: {BATCH_MAX_WORKERS})")
+    sp_batch.add_argument(
+        "--total-timeout",
+        type=float,
+        help="seconds after which operations not yet started are reported as errors (default: no limit)")
+
+    # serve subcommand: run operations read from standard input in a long running process
+    subparsers.add_parser(
+        "serve",
+        help="Run operations read from standard input one JSON line at a time, same format as batch")
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the command line interface. argv defaults to the process arguments.
+    Returns the exit code so the CLI can also be run in process, e.g. by the integration tests.
+    """
+
+    try:
+        return cli(argv)
+    finally:
+        close_connections()
+
+
+def cli(argv):
+    """
+    Parse the arguments, run the command and print the result. See main().
+    """
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
     validate_cli_arguments(parser, args)
+    if args.timeout <= 0:
+        parser.error("--timeout must be greater than 0")
+    configure_request_timeout(args.timeout)
     snow_url = f"https://{args.snow_host.strip()}"
+    # Progress messages would mix with the JSON document, so --json silences them
+    verbose = args.verbose and not args.json
+
+    if args.command == "post-work-note":
+        if args.stdin:
+            if sys.stdin.isatty():
+                print("Enter multiline text for the work note\n"
+                "End with a line containing only ^D (Type control-d)")
+            args.text = sys.stdin.read()
+        if args.text.strip() == "":
+            parser.error("The content for the work note cannot be empty")
+    elif args.command == "batch":
+        if args.max_workers < 1:
+            parser.error("--max-workers must be at least 1")
+        if args.total_timeout is not None and args.total_timeout <= 0:
+            parser.error("--total-timeout must be greater than 0")
+        operations = read_batch_operations(parser, args.file)
 
     try:
         if args.auth == "password":
             user = args.snow_user.strip()
             password = args.snow_password.strip()
-            auth_header = get_basic_auth_header(user, password)
+            get_auth_header = functools.partial(get_basic_auth_header, user, password)
         else:
-            auth_header = get_oauth_bearer_token(
-                snow_url, args.snow_client_id, args.snow_client_secret)
-
-        match args.command:
-            case "create":
-                if args.verbose: print(f"Creating change from template {args.standard_change}...")
-                status, data = create(snow_url, args.standard_change,
-                                      auth_header, short_description=args.short_description, custom=args.custom, snow_profile=args.snow_profile)
-                result_type = "single_change"
-            case "implement":
-                if args.verbose: print(f"Updating change {args.number} state to Implement...")
-                status, data = implement(snow_url, args.number, auth_header, custom=args.custom, snow_profile=args.snow_profile)
-                result_type = "single_change"
-            case "review":
-                if args.verbose:
-                    print(
-                        f"Updating change {
-                            args.number} state to Review with result {
-                            args.result}...")
-                status, data = review(snow_url, args.number, auth_header,
-                                      result=args.result, custom=args.custom, snow_profile=args.snow_profile)
-                result_type = "single_change"
-            case "get":
-                if args.verbose: print(f"Retrieving change with number {args.number}...")
-                status, data = get_by_number(snow_url, args.number, auth_header, snow_profile=args.snow_profile, custom=args.custom)
-                if args.custom:
-                    result_type = "single_change"
-                else:
-                    result_type = "change_list"
-            case "get-template-id":
-                if args.verbose: print(f"Retrieving template \"{args.name}\"...")
-                status, data = get_template_id(
-                    snow_url,
-                    auth_header,
-                    name=args.name,
-                    custom=args.custom,
-                    snow_profile=args.snow_profile,
-                )
-                result_type = "template_list"
-            case "post-work-note":
-                if args.verbose: print(f"Posting work note...")
-                if args.stdin:
-                    if sys.stdin.isatty():
-                        print("Enter multiline text for the work note\n"
-                        "End with a line containing only ^D (Type control-d)")
-                    work_note = sys.stdin.read()
-                else:
-                    work_note = args.text
-                if work_note.strip() == "":
-                    parser.error("The content for the work note cannot be empty")
-                status, data = post_work_note(snow_url, args.number, auth_header, work_note=work_note, custom=args.custom, snow_profile=args.snow_profile)
-                result_type = "table_item"
-            case _:
-                parser.error("unknown command")
+            get_auth_header = functools.partial(
+                get_oauth_bearer_token, snow_url, args.snow_client_id, args.snow_client_secret)
+        auth_header = get_auth_header()
+
+        if args.command == "serve":
+            serve(snow_url, get_auth_header, args.custom, args.snow_profile)
+            return 0
+
+        if args.command == "batch":
+            results = run_batch(snow_url, auth_header, args.custom, args.snow_profile, operations,
+                                args.max_workers, args.total_timeout)
+            for result in results:
+                print(json.dumps(result))
+            return 1 if any("error" in result for result in results) else 0
+
+        status, data, result_type = run_command(
+            snow_url, auth_header, args.custom, args.snow_profile, args.command, vars(args), verbose=verbose)
 
     except urllib.error.HTTPError as e:
-        print(e.code, e.read().decode("utf-8"), file=sys.stderr)
-        sys.exit(1)
+        print(e.code, e.read().decode("utf-8", errors="replace"), file=sys.stderr)
+        return 1
     except urllib.error.URLError as e:
         print("Request failed:", e.reason, file=sys.stderr)
-        sys.exit(1)
+        return 1
     except ValueError as e:
         print(str(e), file=sys.stderr)
-        sys.exit(1)
+        return 1
 
     if status != 200:
         print(f"Error: Unexpected status code - {status}")
-        sys.exit(1)
+        return 1
 
-    if args.verbose: print("The request was successful")
+    if verbose: print("The request was successful")
 
     if args.json:
-        print(json.dumps(data, indent=2))
+        sys.stdout.write(json.dumps(data, indent=2) + "\n")
     else:
+        # Collect the output lines and write them at once rather than with one print() per line
         match result_type:
             case "single_change":
                 change_number = data["result"]["number"] if args.custom else data["result"]["number"]["value"]
                 change_sys_id = data["result"]["sys_id"] if args.custom else data["result"]["sys_id"]["value"]
                 change_state = data["result"]["state"] if args.custom else data["result"]["state"]["display_value"]
-                print("CHANGE_NUMBER=" + change_number)
-                print("CHANGE_SYS_ID=" + change_sys_id)
-                print("CHANGE_STATE=" + change_state)
-                print(
-                    f"CHANGE_LINK={snow_url}/now/nav/ui/classic/params/target/change_request.do?sys_id={change_sys_id}")
+                lines = [
+                    "CHANGE_NUMBER=" + change_number,
+                    "CHANGE_SYS_ID=" + change_sys_id,
+                    "CHANGE_STATE=" + change_state,
+                    f"CHANGE_LINK={snow_url}/now/nav/ui/classic/params/target/change_request.do?sys_id={change_sys_id}"]
             case "change_list":
-                print("CHANGE_NUMBER=" + data["result"][0]["number"]["value"])
-                print("CHANGE_SYS_ID=" + data["result"][0]["sys_id"]["value"])
-                print(
+                lines = [
+                    "CHANGE_NUMBER=" + data["result"][0]["number"]["value"],
+                    "CHANGE_SYS_ID=" + data["result"][0]["sys_id"]["value"],
                     "CHANGE_STATE=" +
-                    data["result"][0]["state"]["display_value"])
-                print(
+                    data["result"][0]["state"]["display_value"],
                     f"CHANGE_LINK={snow_url}/now/nav/ui/classic/params/target/change_request.do?sys_id={
-                        data['result'][0]['sys_id']['value']}")
+                        data['result'][0]['sys_id']['value']}"]
             case "template_list":
                 template_id = data["result"][0]["sys_id"] if args.custom else data["result"][0]["sys_id"]["value"]
-                print("TEMPLATE_ID=" + template_id)
-                print("TEMPLATE_NAME=\"" + args.name + "\"")
-                print(
-                    f"TEMPLATE_LINK={snow_url}/now/nav/ui/classic/params/target/std_change_record_producer.do?sys_id={template_id}")
+                lines = [
+                    "TEMPLATE_ID=" + template_id,
+                    "TEMPLATE_NAME=\"" + args.name + "\"",
+                    f"TEMPLATE_LINK={snow_url}/now/nav/ui/classic/params/target/std_change_record_producer.do?sys_id={template_id}"]
             case "table_item":
-                print("CHANGE_NUMBER=" + data["result"]["number"])
-                print("CHANGE_SYS_ID=" + data["result"]["sys_id"])
-                print("CHANGE_STATE=" + data["result"]["state"])
-                print(
+                lines = [
+                    "CHANGE_NUMBER=" + data["result"]["number"],
+                    "CHANGE_SYS_ID=" + data["result"]["sys_id"],
+                    "CHANGE_STATE=" + data["result"]["state"],
                     f"CHANGE_LINK={snow_url}/now/nav/ui/classic/params/target/change_request.do?sys_id={
-                        data['result']['sys_id']}")
-
+                        data['result']['sys_id']}"]
+        sys.stdout.write("\n".join(lines) + "\n")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
 # Test - Demo 1
@@ -7,14 +7,14 @@ import unittest
 
 
 class TestCliEnvironmentValidation(unittest.TestCase):
-    def setUp(self):
-        self.cli_script = os.path.join(
-            os.path.dirname(__file__),
-            "snow_change_manager.py")
+    # Interpreter and script path, resolved once for all the tests
+    CLI_PREFIX = (
+        sys.executable,
+        os.path.join(os.path.dirname(__file__), "snow_change_manager.py"))
 
     def run_cli(self, args):
         result = subprocess.run(
-            [sys.executable, self.cli_script] + args,
+            (*self.CLI_PREFIX, *args),
             capture_output=True,
             text=True,
         )
@@ -34,6 +34,7 @@ class TestCliEnvironmentValidation(unittest.TestCase):
         self.assertIn("--custom", result.stdout)
         self.assertIn("--json", result.stdout)
         self.assertIn("--verbose", result.stdout)
+        self.assertIn("--timeout", result.stdout)
 
     def test_missing_password_required_arguments_are_reported(self):
         result = self.run_cli(
@@ -1,11 +1,17 @@
 #!/usr/bin/env python
 
 import unittest
-import subprocess
+import io
 import os
-import sys
+from contextlib import redirect_stderr, redirect_stdout
 from datetime import datetime
 import json
+import re
+
+import snow_change_manager
+
+# One key=value line of the CLI output, the value may contain "="
+KEY_VALUE_LINE = re.compile(r"^([^=\n]+)=(.*)$", re.MULTILINE)
 
 
 class TestSnowChangeLifecycle(unittest.TestCase):
@@ -14,173 +20,162 @@ class TestSnowChangeLifecycle(unittest.TestCase):
     Tests the full lifecycle: create -> update (Implement) -> update (Review) -> close (successful)
     """
 
+    # Test inputs read from the environment, stored as lower case class attributes e.g. SNOW_HOST in cls.snow_host
+    REQUIRED_VARS = (
+        "SNOW_HOST",
+        "SNOW_USER",
+        "SNOW_PASSWORD",
+        "SNOW_STANDARD_CHANGE",
+    )
+
     @classmethod
     def setUpClass(cls):
-        """Verify required test inputs are set."""
-        cls.snow_host = os.environ.get("SNOW_HOST")
-        cls.snow_user = os.environ.get("SNOW_USER")
-        cls.snow_password = os.environ.get("SNOW_PASSWORD")
-        cls.snow_standard_change = os.environ.get("SNOW_STANDARD_CHANGE")
-        cls.change_number = None
-
-        missing_vars = []
-        for var in [
-            "SNOW_HOST",
-            "SNOW_USER",
-            "SNOW_PASSWORD",
-                "SNOW_STANDARD_CHANGE"]:
-            if not os.environ.get(var):
-                missing_vars.append(var)
-
+        """
+        Verify required test inputs are set and create the change.
+        The change is created once and shared by all the lifecycle tests.
+        """
+        values = {var: os.environ.get(var) for var in cls.REQUIRED_VARS}
+        missing_vars = [var for var, value in values.items() if not value]
         if missing_vars:
             raise RuntimeError(
                 f"Missing required environment variables: {
                     ', '.join(missing_vars)}")
 
-    def setUp(self):
-        """Reset state for each test."""
-        self.change_number = None
-        self.cli_script = os.path.join(
-            os.path.dirname(__file__),
-            "snow_change_manager.py")
+        for var, value in values.items():
+            setattr(cls, var.lower(), value)
+        # Lifecycle steps that passed, see require()
+        cls.completed_steps = set()
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        returncode, stdout, stderr = cls.run_cli(
+            "create",
+            "--standard-change", cls.snow_standard_change,
+            "--short-description", f"Integration Test Change on {now}"
+        )
+        if returncode != 0:
+            raise RuntimeError(f"CLI failed to create the change: {stderr}\nOutput:\n{stdout}")
+        cls.create_output = cls.parse_cli_output(stdout)
+        cls.change_number = cls.create_output["CHANGE_NUMBER"]
+
+    def require(self, *steps):
+        """
+        Skip the test unless the lifecycle steps it depends on passed.
+        A failed step then only fails once instead of failing every later test.
+        """
+        missing = [step for step in steps if step not in self.completed_steps]
+        if missing:
+            self.skipTest(f"depends on failed step(s): {', '.join(missing)}")
 
-    def run_cli(self, *args):
+    def assertChangeFields(self, record, expected):
         """
-        Execute the CLI with given arguments.
+        Check the fields of a change record returned with --json.
+        Nested standard API fields are flattened to "field.attribute" keys, e.g. "state.display_value".
+        """
+        flat = {}
+        for field, value in record.items():
+            if isinstance(value, dict):
+                for attribute, attribute_value in value.items():
+                    flat[f"{field}.{attribute}"] = attribute_value
+            else:
+                flat[field] = value
+        self.assertEqual({key: flat.get(key) for key in expected}, expected)
+
+    @classmethod
+    def run_cli(cls, *args):
+        """
+        Execute the CLI in this process with given arguments, saving an interpreter start per call.
         Returns (returncode, stdout, stderr).
         """
-        cmd = [
-            sys.executable,
-            self.cli_script,
+        argv = [
             "--auth", "password",
-            "--snow-host", self.snow_host,
-            "--snow-user", self.snow_user,
-            "--snow-password", self.snow_password,
+            "--snow-host", cls.snow_host,
+            "--snow-user", cls.snow_user,
+            "--snow-password", cls.snow_password,
         ] + list(args)
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode, result.stdout, result.stderr
-
-    def parse_cli_output(self, output):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                returncode = snow_change_manager.main(argv)
+            except SystemExit as e:
+                # Only argparse errors exit, main() returns the exit code of everything else
+                returncode = e.code
+        return returncode, stdout.getvalue(), stderr.getvalue()
+
+    @staticmethod
+    def parse_cli_output(output):
         """Parse key=value output from CLI."""
-        result = {}
-        for line in output.strip().split('\n'):
-            if '=' in line:
-                key, val = line.split('=', 1)
-                result[key] = val
-        return result
+        return dict(KEY_VALUE_LINE.findall(output))
 
     def test_01_create_change(self):
         """Test: Create a new standard change."""
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        returncode, stdout, stderr = self.run_cli(
-            "create",
-            "--standard-change", self.snow_standard_change,
-            "--short-description", f"Integration Test Change on {now}"
-        )
+        output = self.create_output
 
-        self.assertEqual(
-            returncode,
-            0,
-            f"CLI failed: {stderr}\nOutput:\n{stdout}")
-        output = self.parse_cli_output(stdout)
-
-        # Store change number for subsequent tests
-        self.change_number = output["CHANGE_NUMBER"]
-        self.__class__.change_number = self.change_number
-
-        # Verify via GET with --json
-        returncode, stdout, stderr = self.run_cli(
-            "--json",
-            "get",
-            "--number", self.change_number,
-        )
-        self.assertEqual(returncode, 0, f"GET verification failed: {stderr}")
-        data = json.loads(stdout)
-
-        self.assertEqual(
-            data["result"][0]["sys_id"]["value"],
-            output["CHANGE_SYS_ID"])
-        self.assertEqual(
-            data["result"][0]["number"]["value"],
-            output['CHANGE_NUMBER'])
-        self.assertEqual(data["result"][0]["state"]
-                         ["display_value"], "Scheduled")
+        # The create output already reports the new change, no separate GET is needed to verify it
+        self.assertTrue(output["CHANGE_SYS_ID"])
+        self.assertIn(output["CHANGE_SYS_ID"], output["CHANGE_LINK"])
+        self.assertEqual(output["CHANGE_STATE"], "Scheduled")
 
         print(
             f"\n✓ Created change: {
                 output['CHANGE_NUMBER']} ({
-                self.change_number}) with state: Scheduled")
+                output['CHANGE_SYS_ID']}) with state: Scheduled")
 
     def test_02_update_to_implement(self):
         """Test: Update change state to Implement."""
-        change_number = self.__class__.change_number
-
-        self.assertIsNotNone(
-            change_number,
-            "change_number not set from test_01_create_change")
+        change_number = self.change_number
 
+        # The update response holds the updated change, no separate GET is needed to verify it
         returncode, stdout, stderr = self.run_cli(
+            "--json",
             "implement",
             "--number", change_number
         )
 
         self.assertEqual(returncode, 0, f"CLI failed: {stderr}")
-
-        # Verify via GET with --json
-        returncode, stdout, stderr = self.run_cli(
-            "--json",
-            "get",
-            "--number", change_number,
-        )
-        self.assertEqual(returncode, 0, f"GET verification failed: {stderr}")
         data = json.loads(stdout)
-        self.assertEqual(data["result"][0]["number"]["value"], change_number)
-        self.assertEqual(data["result"][0]["state"]
-                         ["display_value"], "Implement")
+        self.assertChangeFields(data["result"], {
+            "number.value": change_number,
+            "state.display_value": "Implement"})
 
         print(f"✓ Updated change to Implement")
+        self.completed_steps.add("implement")
 
     def test_03_update_to_review(self):
         """Test: Update change state to Review."""
-        change_number = self.__class__.change_number
-        self.assertIsNotNone(
-            change_number,
-            "change_number not set from test_01_create_change")
+        self.require("implement")
+        change_number = self.change_number
 
+        # The update response holds the updated change, no separate GET is needed to verify it
         returncode, stdout, stderr = self.run_cli(
+            "--json",
             "review",
             "--number", change_number,
             "--result", "successful"
         )
 
         self.assertEqual(returncode, 0, f"CLI failed: {stderr}")
-
-        # Verify via GET with --json
-        returncode, stdout, stderr = self.run_cli(
-            "--json",
-            "get",
-            "--number", change_number,
-        )
-        self.assertEqual(returncode, 0, f"GET verification failed: {stderr}")
         data = json.loads(stdout)
-        self.assertEqual(data["result"][0]["number"]["value"], change_number)
-        self.assertEqual(data["result"][0]["state"]["display_value"], "Review")
+        self.assertChangeFields(data["result"], {
+            "number.value": change_number,
+            "state.display_value": "Review"})
 
         print(f"✓ Updated change to Review")
+        self.completed_steps.add("review")
 
     def test_04_post_work_note(self):
         """Test: Post work note to change."""
-        change_number = self.__class__.change_number
-        self.assertIsNotNone(
-            change_number,
-            "change_number not set from test_01_create_change")
+        change_number = self.change_number
 
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Longer than GZIP_BODY_SIZE so the request body is sent compressed, but not split into chunks
+        work_note = f"Test new work note on {now}." + " Padding to send a compressed request body." * 30
+        self.assertGreater(len(work_note), snow_change_manager.GZIP_BODY_SIZE)
 
         returncode, stdout, stderr = self.run_cli(
             "post-work-note",
             "--number", change_number,
-            "--text", f"Test new work note on {now}"
+            "--text", work_note
         )
 
         self.assertEqual(returncode, 0, f"CLI failed: {stderr}")
@@ -193,28 +188,14 @@ class TestSnowChangeLifecycle(unittest.TestCase):
         )
         self.assertEqual(returncode, 0, f"GET verification failed: {stderr}")
         data = json.loads(stdout)
-        self.assertEqual(data["result"][0]["number"]["value"], change_number)
+        self.assertChangeFields(data["result"][0], {"number.value": change_number})
         self.assertIn(
-            f"Test new work note on {now}",
+            work_note,
             data["result"][0]["comments_and_work_notes"]['display_value'])
 
         print(f"✓ Posted work note")
 
 
 if __name__ == "__main__":
-    # Create a test suite with tests in order, stopping on first failure
-    loader = unittest.TestLoader()
-    suite = unittest.TestSuite()
-
-    # Add tests in specific order
-    suite.addTest(TestSnowChangeLifecycle('test_01_create_change'))
-    suite.addTest(TestSnowChangeLifecycle('test_02_update_to_implement'))
-    suite.addTest(TestSnowChangeLifecycle('test_03_update_to_review'))
-    suite.addTest(TestSnowChangeLifecycle('test_04_post_work_note'))
-
-    # Run with stop on first failure
-    runner = unittest.TextTestRunner(verbosity=2, failfast=True)
-    result = runner.run(suite)
-
-    # Exit with appropriate code
-    sys.exit(0 if result.wasSuccessful() else 1)
+    # The tests run in name order, the dependencies between them are declared with require()
+    unittest.main(verbosity=2)
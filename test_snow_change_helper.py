@@ -24,6 +24,30 @@ class _MockHttpResponse:
         return False
 
 
+class _MockGithubApiResponse:
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+class _MockLogResponse:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def read(self):
+        return self._body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
 class TestSnowChangeHelper(unittest.TestCase):
     def run_main(self, argv: list[str], env: dict[str, str]) -> str:
         stdout = io.StringIO()
@@ -143,6 +167,38 @@ class TestSnowChangeHelper(unittest.TestCase):
         )
         mock_urlopen.assert_called_once()
 
+    @patch("snow_change_helper.urllib.request.urlopen")
+    @patch("snow_change_helper.http.client.HTTPSConnection")
+    def test_github_actions_logs_reuses_github_api_connection(
+            self, mock_connection_class, mock_urlopen):
+        snow_change_helper._github_api_connection = None
+        self.addCleanup(setattr, snow_change_helper, "_github_api_connection", None)
+        conn = mock_connection_class.return_value
+        conn.getresponse.side_effect = [
+            _MockGithubApiResponse(200, {}, json.dumps(
+                {"jobs": [{"id": 7, "name": "Other job"}, {"id": 8, "name": "Test job"}]}).encode("utf-8")),
+            _MockGithubApiResponse(302, {"Location": "https://logs.example.com/job/8"}, b""),
+        ]
+        mock_urlopen.return_value = _MockLogResponse(b"line 1\nline 2")
+        env = {
+            "REPO_OWNER": "owner",
+            "REPO_NAME": "repo",
+            "GITHUB_TOKEN": "fake-token",
+        }
+
+        output = self.run_main(
+            ["--output-mode", "stdout", "github-actions-logs", "--run-id", "123", "--job", "Test job"], env)
+
+        self.assertEqual(output, "line 1\nline 2\n")
+        mock_connection_class.assert_called_once_with("api.github.com", timeout=30)
+        self.assertEqual(
+            [c.args for c in conn.request.call_args_list],
+            [("GET", "/repos/owner/repo/actions/runs/123/jobs"),
+             ("GET", "/repos/owner/repo/actions/jobs/8/logs")])
+        redirect_request = mock_urlopen.call_args.args[0]
+        self.assertEqual(redirect_request.full_url, "https://logs.example.com/job/8")
+        self.assertFalse(redirect_request.has_header("Authorization"))
+
 
 if __name__ == "__main__":
     unittest.main()